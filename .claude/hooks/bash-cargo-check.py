@@ -4,11 +4,84 @@ PreToolUse hook for Bash commands to prevent direct cargo usage.
 Redirects Claude to use just/moon workflow instead of bypassing task orchestration.
 """
 
-import json
+from __future__ import annotations
+
+import glob
+import hashlib
 import sys
-import re
+import select
+import shutil
 import subprocess
 import os
+import tempfile
+import time
+
+from jsoncodec import json_dumps, json_loads
+from patterns import (
+    CARGO_COMMAND_RE,
+    GENERIC_CARGO_RE,
+    JUST_LINE_RE,
+    MOON_PROJECT_RE,
+    MOON_TASK_RE,
+    WHITESPACE_RE,
+)
+
+
+# Parsed task lists are cached here, keyed by the mtimes of the files that define them
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "tram-hooks",
+)
+
+# Upper bound (seconds) for running `just --list` and `moon query tasks` together
+TASK_DISCOVERY_TIMEOUT = 5
+
+# File names just accepts for a project's justfile
+JUSTFILE_NAMES = ("justfile", "Justfile", ".justfile")
+
+# Limit moon suggestions to keep the message readable
+MAX_MOON_TASKS = 10
+
+
+# Common cargo commands that should be avoided, and what to use instead
+CARGO_SUGGESTIONS = {
+    'build': 'just build',
+    'test': 'just test',
+    'check': 'just check',
+    'clippy': 'just check',
+    'fmt': 'just check',
+    'run': 'just run',
+    'clean': 'just clean',
+    'doc': 'moon run :doc (if configured)',
+    'bench': 'moon run :bench (if configured)',
+    'publish': 'moon run :publish (if configured)',
+}
+
+
+FALLBACK_COMMANDS = """Available commands:
+• `just --list` - Show all available development commands
+• `moon query tasks` - Show moon task definitions
+• `just check` - Format, lint, build, test pipeline
+• `just build [CRATE]` - Build workspace or specific crate
+• `just test [CRATE]` - Run tests
+• `just run [ARGS]` - Run the CLI application"""
+
+ORCHESTRATION_BENEFITS = """
+
+Using the task orchestration provides:
+- Intelligent caching and incremental builds
+- Proper dependency resolution between crates
+- Parallel execution where possible
+- Consistent development workflows"""
+
+# Pre-encoded deny response; only the reason is substituted per interception
+DENY_TEMPLATE = json_dumps({
+    "hookSpecificOutput": {
+        "hookEventName": "PreToolUse",
+        "permissionDecision": "deny",
+        "permissionDecisionReason": "__REASON__"
+    }
+})
 
 
 def check_cargo_command(command: str) -> tuple[bool, str]:
@@ -16,118 +89,292 @@ def check_cargo_command(command: str) -> tuple[bool, str]:
     Check if the command uses cargo directly and suggest alternatives.
     Returns (is_cargo_command, suggestion).
     """
+    # Most Bash commands never mention cargo; reject them before any regex work
+    if 'cargo' not in command.lower():
+        return False, ""
+
     # Normalize whitespace and check for cargo commands
-    normalized_command = re.sub(r'\s+', ' ', command.strip())
-    
-    # Common cargo commands that should be avoided
-    cargo_patterns = [
-        (r'\bcargo\s+build\b', 'just build'),
-        (r'\bcargo\s+test\b', 'just test'),
-        (r'\bcargo\s+check\b', 'just check'),
-        (r'\bcargo\s+clippy\b', 'just check'),
-        (r'\bcargo\s+fmt\b', 'just check'),
-        (r'\bcargo\s+run\b', 'just run'),
-        (r'\bcargo\s+clean\b', 'just clean'),
-        (r'\bcargo\s+doc\b', 'moon run :doc (if configured)'),
-        (r'\bcargo\s+bench\b', 'moon run :bench (if configured)'),
-        (r'\bcargo\s+publish\b', 'moon run :publish (if configured)'),
-    ]
+    normalized_command = WHITESPACE_RE.sub(' ', command.strip())
     
-    for pattern, suggestion in cargo_patterns:
-        if re.search(pattern, normalized_command, re.IGNORECASE):
-            return True, f"Use '{suggestion}' instead of direct cargo usage"
+    match = CARGO_COMMAND_RE.search(normalized_command)
+    if match:
+        suggestion = CARGO_SUGGESTIONS[match.group(1).lower()]
+        return True, f"Use '{suggestion}' instead of direct cargo usage"
     
     # Generic cargo command detection
-    if re.search(r'\bcargo\s+\w+', normalized_command, re.IGNORECASE):
+    if GENERIC_CARGO_RE.search(normalized_command):
         return True, "Use 'just --list' or 'moon query tasks' to find the appropriate task"
     
     return False, ""
 
 
-def get_just_tasks(project_dir: str) -> list[str]:
-    """Get available just tasks."""
+def _moon_project_locations(project_dir: str) -> list[str]:
+    """
+    Read the project globs and source paths listed under `projects:` in
+    .moon/workspace.yml, falling back to moon's `*` and `*/*` defaults.
+    This is a line scan rather than a YAML parse: it only understands block
+    style with one entry per line, not inline `[...]` or `{...}` values.
+    """
+    locations = []
+    in_projects = False
     try:
-        result = subprocess.run(
-            ['just', '--list'],
-            cwd=project_dir,
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        
-        if result.returncode == 0:
-            tasks = []
-            lines = result.stdout.strip().split('\n')
-            for line in lines:
-                # Parse just --list output format: "task-name # description"
-                if line.strip() and not line.startswith('Available recipes:'):
-                    # Extract task name (first word before any spaces or #)
-                    task_line = line.strip()
-                    if task_line:
-                        # Handle both "task" and "task arg" formats
-                        parts = task_line.split()
-                        if parts:
-                            task_name = parts[0]
-                            # Get description if available
-                            if '#' in task_line:
-                                desc = task_line.split('#', 1)[1].strip()
-                                tasks.append(f"• `just {task_name}` - {desc}")
-                            else:
-                                tasks.append(f"• `just {task_name}`")
-            return tasks
-    except (subprocess.TimeoutExpired, FileNotFoundError, Exception):
+        with open(os.path.join(project_dir, ".moon", "workspace.yml"), encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.lstrip().startswith("#"):
+                    continue
+                if not line[0].isspace():
+                    in_projects = line.startswith("projects:")
+                    continue
+                match = MOON_PROJECT_RE.match(line) if in_projects else None
+                if match:
+                    locations.append(match.group(1))
+    except OSError:
         pass
-    
-    return []
+    return locations or ["*", "*/*"]
+
+
+def _task_sources(project_dir: str, kind: str) -> list[str]:
+    """
+    List the files whose contents determine the task list for `kind`.
+    New moon projects are only noticed once they add a moon.yml.
+    """
+    if kind == "just":
+        candidates = [
+            os.path.join(project_dir, name)
+            for name in JUSTFILE_NAMES
+        ]
+    else:
+        # Workspace and toolchain configs, plus inherited tasks such as
+        # .moon/tasks/rust.yml; .moon/cache/ is never walked
+        candidates = glob.glob(os.path.join(project_dir, ".moon", "*.yml"))
+        candidates.extend(
+            glob.glob(os.path.join(project_dir, ".moon", "tasks", "**", "*.yml"), recursive=True)
+        )
+        candidates.append(os.path.join(project_dir, "moon.yml"))
+        for location in _moon_project_locations(project_dir):
+            candidates.extend(
+                glob.glob(os.path.join(project_dir, location, "moon.yml"), recursive=True)
+            )
+        candidates = list(dict.fromkeys(os.path.normpath(path) for path in candidates))
+    return [path for path in candidates if os.path.isfile(path)]
 
 
-def get_moon_tasks(project_dir: str) -> list[str]:
-    """Get available moon tasks."""
+def _task_cache_path(project_dir: str, kind: str) -> str | None:
+    """
+    Build the cache file path for `kind` from a cheap fingerprint of its sources.
+    Returns None if there is nothing to fingerprint.
+    """
+    try:
+        mtimes = [os.stat(path).st_mtime_ns for path in _task_sources(project_dir, kind)]
+    except OSError:
+        return None
+    if not mtimes:
+        return None
+
+    project_key = hashlib.blake2b(
+        os.path.abspath(project_dir).encode(), digest_size=8
+    ).hexdigest()
+    return os.path.join(
+        CACHE_DIR, f"{kind}-{project_key}-{max(mtimes)}-{len(mtimes)}.json"
+    )
+
+
+def _load_cached_tasks(project_dir: str, kind: str) -> list[str] | None:
+    """Return the cached task list for `kind`, or None on a cache miss."""
+    cache_path = _task_cache_path(project_dir, kind)
+    if not cache_path:
+        return None
+    try:
+        with open(cache_path, "rb") as f:
+            tasks = json_loads(f.read())
+    except (OSError, ValueError):
+        return None
+    return tasks if isinstance(tasks, list) else None
+
+
+def _store_cached_tasks(project_dir: str, kind: str, tasks: list[str]) -> None:
+    """Atomically write the task list for `kind`, dropping stale fingerprints."""
+    cache_path = _task_cache_path(project_dir, kind)
+    if not cache_path or not tasks:
+        return
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(json_dumps(tasks))
+        os.replace(tmp_path, cache_path)
+
+        # Older fingerprints for this project can never be hit again
+        prefix = os.path.basename(cache_path).rsplit("-", 2)[0]
+        for stale in glob.glob(os.path.join(CACHE_DIR, f"{prefix}-*.json")):
+            if stale != cache_path:
+                os.remove(stale)
+    except OSError:
+        # Don't leave a partial write behind; after the replace this is a no-op
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def spawn(args: list[str]) -> subprocess.Popen | None:
+    """
+    Start a command in the current directory with stdout piped and stderr discarded.
+    Returns None if the command is not installed.
+    """
+    executable = shutil.which(args[0])
+    if executable is None:
+        return None
     try:
-        result = subprocess.run(
-            ['moon', 'query', 'tasks'],
-            cwd=project_dir,
-            capture_output=True,
-            text=True,
-            timeout=5
+        # An absolute executable, no cwd and close_fds=False let CPython use
+        # posix_spawn instead of fork; our own descriptors are non-inheritable anyway
+        return subprocess.Popen(
+            [executable, *args[1:]],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            close_fds=False
         )
-        
-        if result.returncode == 0:
-            tasks = []
-            # Parse moon output - look for task patterns like "tram:build", ":lint", etc.
-            lines = result.stdout.strip().split('\n')
-            for line in lines:
-                line = line.strip()
-                if ':' in line and not line.startswith('✓') and not line.startswith('Tasks:'):
-                    # Extract task patterns
-                    task_match = re.search(r'([a-zA-Z0-9_-]*):([a-zA-Z0-9_-]+)', line)
-                    if task_match:
-                        project, task = task_match.groups()
-                        if project:
-                            tasks.append(f"• `moon run {project}:{task}`")
-                        else:
-                            tasks.append(f"• `moon run :{task}`")
-            
-            # Remove duplicates while preserving order
-            seen = set()
-            unique_tasks = []
-            for task in tasks:
-                if task not in seen:
-                    seen.add(task)
-                    unique_tasks.append(task)
-            
-            return unique_tasks[:10]  # Limit to first 10 to keep message readable
-    except (subprocess.TimeoutExpired, FileNotFoundError, Exception):
-        pass
-    
-    return []
+    except OSError:
+        return None
+
+
+def start_just_tasks() -> subprocess.Popen | None:
+    """Start `just --list` without waiting for it to finish."""
+    return spawn(['just', '--list'])
+
+
+def start_moon_tasks() -> subprocess.Popen | None:
+    """Start `moon query tasks` without waiting for it to finish."""
+    return spawn(['moon', 'query', 'tasks'])
+
+
+def stream_lines(process: subprocess.Popen, deadline: float):
+    """
+    Yield raw stdout lines as soon as they arrive.
+    Lines stay as bytes; parsers decode only the fields they extract.
+    Raises subprocess.TimeoutExpired if the deadline passes first.
+    """
+    stdout_fd = process.stdout.fileno()
+    pending = b""
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise subprocess.TimeoutExpired(process.args, TASK_DISCOVERY_TIMEOUT)
+
+        ready, _, _ = select.select([stdout_fd], [], [], remaining)
+        if not ready:
+            continue
+
+        data = os.read(stdout_fd, 65536)
+        if not data:
+            break
+        *lines, pending = (pending + data).split(b'\n')
+        yield from lines
+
+    if pending:
+        yield pending
+    process.stdout.close()
+
+
+def parse_just_tasks(lines) -> list[str]:
+    """Parse `just --list` output lines into task suggestions."""
+    # Parse just --list output format: "task-name [args] # description"
+    return [
+        f"• `just {match.group(1).decode()}` - {match.group(2).strip().decode(errors='replace')}"
+        if match.group(2)
+        else f"• `just {match.group(1).decode()}`"
+        for line in lines
+        if not line.startswith(b'Available recipes:') and (match := JUST_LINE_RE.match(line))
+    ]
+
+
+def parse_moon_tasks(lines) -> list[str]:
+    """
+    Parse `moon query tasks` output lines into task suggestions.
+    Stops reading once enough unique tasks have been found.
+    """
+    # Insertion-ordered dict doubles as an ordered set for de-duplication
+    unique_tasks = {}
+    # Parse moon output - look for task patterns like "tram:build", ":lint", etc.
+    for line in lines:
+        line = line.strip()
+        if line.startswith(('✓'.encode(), b'Tasks:')):
+            continue
+        task_match = MOON_TASK_RE.search(line)
+        if task_match:
+            project, task = task_match.group(1).decode(), task_match.group(2).decode()
+            unique_tasks[f"• `moon run {project}:{task}`"] = None
+            if len(unique_tasks) >= MAX_MOON_TASKS:
+                break
+
+    return list(unique_tasks)
+
+
+def collect_tasks(process: subprocess.Popen | None, parse, deadline: float) -> list[str]:
+    """Stream a task discovery process's output through its parser."""
+    if process is None:
+        return []
+    try:
+        tasks = parse(stream_lines(process, deadline))
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+        return []
+
+    if not process.stdout.closed:
+        # The parser stopped early, so the rest of the output is not needed
+        process.terminate()
+        process.wait()
+        return tasks
+
+    try:
+        returncode = process.wait(timeout=max(0.0, deadline - time.monotonic()))
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+        return []
+    return tasks if returncode == 0 else []
+
+
+def get_available_tasks(project_dir: str) -> tuple[list[str], list[str]]:
+    """
+    Get available just and moon tasks, from cache where possible.
+    Cache misses are discovered concurrently under a shared timeout, running
+    from the current directory, which main() sets to the project directory.
+    Returns (just_tasks, moon_tasks).
+    """
+    # Projects without a justfile or moon workspace have nothing to discover
+    has_just = any(os.path.isfile(os.path.join(project_dir, name)) for name in JUSTFILE_NAMES)
+    has_moon = os.path.isdir(os.path.join(project_dir, ".moon"))
+
+    just_tasks = _load_cached_tasks(project_dir, "just") if has_just else []
+    moon_tasks = _load_cached_tasks(project_dir, "moon") if has_moon else []
+
+    # Launch both lookups before waiting on either
+    just_process = start_just_tasks() if just_tasks is None else None
+    moon_process = start_moon_tasks() if moon_tasks is None else None
+    deadline = time.monotonic() + TASK_DISCOVERY_TIMEOUT
+
+    if just_tasks is None:
+        just_tasks = collect_tasks(just_process, parse_just_tasks, deadline)
+        _store_cached_tasks(project_dir, "just", just_tasks)
+
+    if moon_tasks is None:
+        moon_tasks = collect_tasks(moon_process, parse_moon_tasks, deadline)
+        _store_cached_tasks(project_dir, "moon", moon_tasks)
+
+    return just_tasks, moon_tasks
 
 
 def main():
     try:
-        # Read input from stdin
-        input_data = json.load(sys.stdin)
-    except json.JSONDecodeError as e:
+        # Read input from stdin as bytes, skipping the text decode layer
+        input_data = json_loads(sys.stdin.buffer.read())
+    except ValueError as e:
         print(f"Error: Invalid JSON input: {e}", file=sys.stderr)
         sys.exit(1)
     
@@ -150,10 +397,16 @@ def main():
         project_dir = os.environ.get("CLAUDE_PROJECT_DIR")
         if not project_dir:
             project_dir = input_data.get("cwd", ".")
+        project_dir = os.path.abspath(project_dir)
+        
+        # Task discovery runs from here, so subprocesses need no cwd
+        try:
+            os.chdir(project_dir)
+        except OSError:
+            pass
         
         # Get available tasks dynamically
-        just_tasks = get_just_tasks(project_dir)
-        moon_tasks = get_moon_tasks(project_dir)
+        just_tasks, moon_tasks = get_available_tasks(project_dir)
         
         # Build available commands section
         commands_section = ""
@@ -167,34 +420,16 @@ def main():
         
         if not commands_section:
             # Fallback if dynamic lookup fails
-            commands_section = """Available commands:
-• `just --list` - Show all available development commands
-• `moon query tasks` - Show moon task definitions
-• `just check` - Format, lint, build, test pipeline
-• `just build [CRATE]` - Build workspace or specific crate
-• `just test [CRATE]` - Run tests
-• `just run [ARGS]` - Run the CLI application"""
+            commands_section = FALLBACK_COMMANDS
         
         # Use JSON output to provide guidance to Claude
-        feedback = {
-            "hookSpecificOutput": {
-                "hookEventName": "PreToolUse",
-                "permissionDecision": "deny",
-                "permissionDecisionReason": f"""Direct cargo usage detected: `{command.strip()}`
-
-This project uses moon task orchestration through just recipes. {suggestion}
-
-{commands_section}
-
-Using the task orchestration provides:
-- Intelligent caching and incremental builds
-- Proper dependency resolution between crates
-- Parallel execution where possible
-- Consistent development workflows"""
-            }
-        }
-        
-        print(json.dumps(feedback))
+        reason = "".join((
+            f"Direct cargo usage detected: `{command.strip()}`\n\n",
+            f"This project uses moon task orchestration through just recipes. {suggestion}\n\n",
+            commands_section,
+            ORCHESTRATION_BENEFITS,
+        ))
+        print(DENY_TEMPLATE.replace('"__REASON__"', json_dumps(reason)))
         sys.exit(0)
     
     # Allow the command if it's not a direct cargo usage
@@ -0,0 +1,24 @@
+"""
+JSON encoding shared by the Claude Code hooks.
+Uses orjson when it is installed and falls back to the stdlib json module,
+so every payload, cache and state file goes through the same codec.
+"""
+
+from __future__ import annotations
+
+import json
+
+try:
+    import orjson
+except ImportError:  # Optional; the stdlib encoder is used when it is not installed
+    orjson = None
+
+
+def json_loads(data: bytes | str):
+    """Decode JSON, using orjson when available."""
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+def json_dumps(obj) -> str:
+    """Encode JSON, using orjson when available."""
+    return orjson.dumps(obj).decode() if orjson else json.dumps(obj)
@@ -0,0 +1,32 @@
+"""
+Compiled regular expressions shared by the Claude Code hooks.
+Kept in an imported module so the hook scripts, which always run as
+__main__, get their pattern definitions from the bytecode cache.
+"""
+
+from __future__ import annotations
+
+import re
+
+
+# bash-cargo-check.py: direct cargo usage
+CARGO_COMMAND_RE = re.compile(
+    r'\bcargo\s+(build|test|check|clippy|fmt|run|clean|doc|bench|publish)\b',
+    re.IGNORECASE
+)
+GENERIC_CARGO_RE = re.compile(r'\bcargo\s+\w+', re.IGNORECASE)
+WHITESPACE_RE = re.compile(r'\s+')
+
+# bash-cargo-check.py: task output is matched as bytes to avoid decoding whole lines
+JUST_LINE_RE = re.compile(rb'^\s*([A-Za-z0-9_-]+)(?:\s+[^#]*?)?(?:#\s*(.*))?$')
+MOON_TASK_RE = re.compile(rb'([a-zA-Z0-9_-]*):([a-zA-Z0-9_-]+)')
+
+# bash-cargo-check.py: one project location under `projects:` in .moon/workspace.yml,
+# either a `- 'glob'` list item or a `name: 'path'` source
+MOON_PROJECT_RE = re.compile(r'''^\s+(?:-|[\w.-]+:)\s*['"]?([^'"#\s]+)''')
+
+# rust-check.py: a compiler diagnostic runs from its `warning:`/`error[E0308]:` line up to the next one
+WARNING_BLOCK_RE = re.compile(
+    r'^[^\n]*\b(?:warning|error)(?:\[\w+\])?:.*?(?=\n[^\n]*\b(?:warning|error)(?:\[\w+\])?:|\Z)',
+    re.MULTILINE | re.DOTALL
+)
@@ -4,112 +4,794 @@ PostToolUse hook for checking Rust compiler warnings and errors.
 Runs after file edits to provide immediate feedback on compilation issues.
 """
 
-import json
+from __future__ import annotations
+
+import hashlib
+import mmap
+import select
+import shutil
+import signal
+import socket
 import subprocess
 import sys
 import os
+import tempfile
+import threading
+import time
 from pathlib import Path
 
+from jsoncodec import json_dumps, json_loads
+from patterns import WARNING_BLOCK_RE
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; the check daemon is disabled there
+    fcntl = None
+
+
+# Directory holding the per-project check daemon sockets
+RUNTIME_DIR = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+
+# Per-project files recording the last check result of each edited file,
+# together with its content hash and workspace fingerprint
+STATE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "tram-hooks",
+)
+
+# Files remembered per project; the least recently checked are dropped first
+MAX_STATE_ENTRIES = 500
+
+# Seconds a single check may take
+CHECK_TIMEOUT = 30
+
+# Seconds Claude Code allows this hook, matching the timeout in settings.json
+HOOK_TIMEOUT = 60
+
+# When this hook started, for keeping batched checks within HOOK_TIMEOUT
+HOOK_STARTED = time.monotonic()
+
+# Seconds between source tree scans in the check daemon
+WATCH_INTERVAL = 1.0
+
+# Seconds without a request before the check daemon exits
+DAEMON_IDLE_TIMEOUT = 15 * 60
+
+# Seconds to wait for further edits before checking a burst of them together
+DEBOUNCE_DELAY = 0.3
+
+# Context reported when the issues are elsewhere in the workspace
+WORKSPACE_CONTEXT = "There are compilation issues in the workspace that may be related to recent changes."
 
-def is_rust_file(file_path: str) -> bool:
-    """Check if the file is a Rust source file."""
-    return file_path.endswith('.rs')
+# Directories that never contain workspace sources
+IGNORED_DIRS = {"target", "node_modules", ".git", ".moon"}
 
+# Seconds to wait for a newly forked check daemon to start listening
+DAEMON_START_TIMEOUT = 2
 
-def run_rust_check(project_dir: str) -> tuple[bool, str]:
+# Check daemons forked by this hook process, by socket path: their pids, and
+# the read ends of their readiness pipes until those have been consumed
+forked_daemons = {}
+daemon_ready_fds = {}
+
+
+def is_rust_file(file_path: str, project_dir: str) -> bool:
+    """
+    Check if the file is a Rust source file of the workspace.
+    Generated code under target/ and vendored trees never warrant a re-check;
+    only directories below the project directory count, so a project that
+    itself lives under e.g. a target/ directory is still checked.
+    """
+    if file_path[-3:] != '.rs':
+        return False
+    relative = os.path.relpath(os.path.abspath(file_path), project_dir)
+    return IGNORED_DIRS.isdisjoint(Path(relative).parts[:-1])
+
+
+def run_streaming(args: list[str]) -> tuple[int, str]:
     """
-    Run cargo check to detect warnings and errors.
-    Returns (has_issues, output).
+    Run a command in the current directory, draining its merged stdout and
+    stderr as output arrives.
+    Raises FileNotFoundError if the command is not installed, and
+    subprocess.TimeoutExpired if it runs longer than CHECK_TIMEOUT.
+    Returns (returncode, output).
     """
+    executable = shutil.which(args[0])
+    if executable is None:
+        raise FileNotFoundError(args[0])
+
+    # An absolute executable, no cwd and close_fds=False let CPython use
+    # posix_spawn instead of fork; our own descriptors are non-inheritable anyway
+    process = subprocess.Popen(
+        [executable, *args[1:]],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        close_fds=False
+    )
+    output_fd = process.stdout.fileno()
+    chunks = []
+    deadline = time.monotonic() + CHECK_TIMEOUT
+
     try:
-        # Use moon to run the check task for better integration
-        result = subprocess.run(
-            ['moon', 'run', ':lint'],
-            cwd=project_dir,
-            capture_output=True,
-            text=True,
-            timeout=30
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(args, CHECK_TIMEOUT)
+
+            ready, _, _ = select.select([output_fd], [], [], remaining)
+            if not ready:
+                continue
+
+            data = os.read(output_fd, 65536)
+            if not data:
+                break
+            chunks.append(data)
+
+        returncode = process.wait(timeout=max(0.0, deadline - time.monotonic()))
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        process.stdout.close()
+
+    return returncode, b"".join(chunks).decode(errors="replace")
+
+
+def cargo_workspace_root(project_dir: str) -> str:
+    """
+    Find the root of the cargo workspace containing the current directory.
+    Falls back to the project directory if cargo cannot tell.
+    """
+    try:
+        returncode, output = run_streaming(
+            ['cargo', 'locate-project', '--workspace', '--message-format', 'plain']
         )
+    except (subprocess.TimeoutExpired, FileNotFoundError):
+        return project_dir
+
+    manifest = output.strip().splitlines()[-1:] if returncode == 0 else []
+    return os.path.dirname(manifest[0]) if manifest else project_dir
+
+
+def parse_diagnostics(output: str, workspace_root: str) -> list[dict]:
+    """
+    Collect compiler messages from `cargo --message-format=json` output.
+    Each diagnostic lists the absolute paths of the files it points at; span
+    file names are relative to the workspace root.
+    """
+    diagnostics = []
+    for line in output.splitlines():
+        # Only compiler messages are worth decoding; skip artifact and build records
+        if '"reason":"compiler-message"' not in line:
+            continue
+        try:
+            message = json_loads(line)["message"]
+        except (ValueError, KeyError):
+            continue
+        diagnostics.append({
+            "files": [
+                os.path.abspath(os.path.join(workspace_root, span["file_name"]))
+                for span in message.get("spans", [])
+            ],
+            "level": message.get("level", ""),
+            "rendered": message.get("rendered") or message.get("message", ""),
+        })
+    return diagnostics
+
+
+def run_rust_check(project_dir: str) -> tuple[bool, str, list[dict] | None, bool]:
+    """
+    Run cargo check from the current directory to detect warnings and errors.
+    main() changes into the project directory before any check runs.
+    Structured diagnostics are only available from the cargo fallback.
+    Returns (has_issues, output, diagnostics, completed); `completed` is False
+    when the check timed out or could not run, so its result must not be reused.
+    """
+    try:
+        # Use moon to run the check task for better integration
+        returncode, output = run_streaming(['moon', 'run', ':lint'])
         
         # Clippy exits with non-zero for warnings when using -D warnings
-        if result.returncode != 0:
-            return True, result.stderr.strip() or result.stdout.strip()
+        if returncode != 0:
+            return True, output.strip(), None, True
         
-        return False, ""
+        return False, "", None, True
         
     except subprocess.TimeoutExpired:
-        return True, "Rust check timed out after 30 seconds"
+        return True, f"Rust check timed out after {CHECK_TIMEOUT} seconds", None, False
     except FileNotFoundError:
         # Fallback to cargo check if moon is not available
         try:
-            result = subprocess.run(
-                ['cargo', 'check', '--workspace', '--all-targets'],
-                cwd=project_dir,
-                capture_output=True,
-                text=True,
-                timeout=30
+            returncode, output = run_streaming(
+                ['cargo', 'check', '--workspace', '--all-targets', '--message-format=json']
             )
             
-            if result.returncode != 0:
-                return True, result.stderr.strip()
+            if returncode != 0:
+                diagnostics = parse_diagnostics(output, cargo_workspace_root(project_dir))
+                # Without diagnostics, report cargo's own messages minus the JSON records
+                rendered = '\n'.join(d["rendered"] for d in diagnostics) or '\n'.join(
+                    line for line in output.splitlines() if not line.startswith('{')
+                ).strip()
+                return True, rendered, diagnostics, True
             
-            return False, ""
+            return False, "", None, True
             
         except (subprocess.TimeoutExpired, FileNotFoundError):
-            return True, "Could not run Rust compiler check"
+            return True, "Could not run Rust compiler check", None, False
+
+
+def source_fingerprint(project_dir: str, exclude: str | None = None) -> tuple[int, int]:
+    """
+    Fingerprint the workspace sources by their newest mtime and file count.
+    Any edit, addition, or removal of a Rust or Cargo file changes the result.
+    The `exclude` file still counts, but its mtime is ignored.
+    """
+    excluded = os.path.abspath(exclude) if exclude else None
+    newest = 0
+    count = 0
+    for root, dirs, files in os.walk(project_dir):
+        dirs[:] = [d for d in dirs if d not in IGNORED_DIRS]
+        for name in files:
+            if name.endswith('.rs') or name in ("Cargo.toml", "Cargo.lock"):
+                path = os.path.join(root, name)
+                count += 1
+                if excluded and os.path.abspath(path) == excluded:
+                    continue
+                try:
+                    newest = max(newest, os.stat(path).st_mtime_ns)
+                except OSError:
+                    continue
+    return newest, count
+
+
+def hash_file(file_path: str) -> str | None:
+    """Hash a file's contents, or return None if it cannot be read."""
+    try:
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return hashlib.blake2b(b"", digest_size=16).hexdigest()
+            # Map the file so large sources are hashed page by page without a bytes copy
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return hashlib.blake2b(mapped, digest_size=16).hexdigest()
+    except (OSError, ValueError):
+        return None
+
+
+def project_key(project_dir: str) -> str:
+    """Get a short stable key for per-project file names."""
+    return hashlib.blake2b(os.path.abspath(project_dir).encode(), digest_size=8).hexdigest()
+
+
+def check_state_path(project_dir: str) -> str:
+    """Get the project's check state file."""
+    return os.path.join(STATE_DIR, f"rust-check-state-{project_key(project_dir)}.json")
+
+
+def load_check_state(project_dir: str) -> dict:
+    """Load the last check result recorded for each edited file of the project."""
+    try:
+        with open(check_state_path(project_dir), "rb") as f:
+            state = json_loads(f.read())
+    except (OSError, ValueError):
+        return {}
+    return state if isinstance(state, dict) else {}
+
+
+def save_check_state(project_dir: str, state: dict) -> None:
+    """Atomically persist the project's per-file check results, capped in size."""
+    # Entries are kept in the order they were last recorded
+    for file_path in list(state)[:-MAX_STATE_ENTRIES]:
+        del state[file_path]
+    try:
+        os.makedirs(STATE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=STATE_DIR, suffix=".tmp")
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(json_dumps(state))
+        os.replace(tmp_path, check_state_path(project_dir))
+    except OSError:
+        # Don't leave a partial write behind
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def runtime_path(project_dir: str, suffix: str) -> str:
+    """Get a per-project path in the runtime directory."""
+    return os.path.join(RUNTIME_DIR, f"tram-check-{project_key(project_dir)}.{suffix}")
+
+
+def check_socket_path(project_dir: str) -> str:
+    """Get the check daemon socket path for a project."""
+    return runtime_path(project_dir, "sock")
+
+
+def serve_checks(project_dir: str, socket_path: str, ready_fd: int | None = None) -> None:
+    """
+    Run the check daemon loop.
+    Re-checks the workspace whenever the sources change and answers each
+    request with the result for the current sources, exiting once idle.
+    Writes to `ready_fd`, if given, once the socket is accepting connections.
+    """
+    # Only one daemon per project; a concurrent start simply exits. The lock
+    # holder alone touches the socket path, and records its pid in the lock file
+    lock_file = open(f"{socket_path}.lock", "a+")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return
+    lock_file.truncate(0)
+    lock_file.write(f"{os.getpid()}\n")
+    lock_file.flush()
+
+    # Bind under a temporary name so clients never see a socket that is not listening
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    pending_path = f"{socket_path}.{os.getpid()}"
+
+    # Sources last checked, and sources whose check completed; a check that
+    # timed out or could not run is not retried by the watcher, only on request
+    attempted_fingerprint = None
+    checked_fingerprint = None
+    result = (False, "", None, True)
+    last_request = time.monotonic()
+
+    # Everything from the bind on is unwound by the finally below, even when
+    # stop_check_daemon() terminates the daemon right after it reports ready
+    try:
+        server.bind(pending_path)
+        server.listen()
+        os.replace(pending_path, socket_path)
+        server.settimeout(WATCH_INTERVAL)
+        if ready_fd is not None:
+            os.write(ready_fd, b"1")
+            os.close(ready_fd)
+
+        while time.monotonic() - last_request < DAEMON_IDLE_TIMEOUT:
+            fingerprint = source_fingerprint(project_dir)
+            if fingerprint != attempted_fingerprint:
+                result = run_rust_check(project_dir)
+                attempted_fingerprint = fingerprint
+                checked_fingerprint = fingerprint if result[3] else None
+                continue  # Sources may have changed again while checking
+
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+
+            with conn:
+                conn.settimeout(CHECK_TIMEOUT)
+                try:
+                    # Request body: {"file": ...}; liveness probes send nothing
+                    if not conn.makefile("rb").readline():
+                        continue
+                    # The edit that triggered this request may postdate the last scan
+                    fingerprint = source_fingerprint(project_dir)
+                    if fingerprint != checked_fingerprint:
+                        result = run_rust_check(project_dir)
+                        attempted_fingerprint = fingerprint
+                        checked_fingerprint = fingerprint if result[3] else None
+                    has_issues, output, diagnostics, completed = result
+                    conn.sendall(json_dumps({
+                        "has_issues": has_issues,
+                        "output": output,
+                        "diagnostics": diagnostics,
+                        "completed": completed,
+                    }).encode())
+                except OSError:
+                    pass
+            last_request = time.monotonic()
+    finally:
+        server.close()
+        for path in (pending_path, socket_path):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+def daemon_listening(socket_path: str) -> bool:
+    """Check whether a check daemon is accepting connections on the socket."""
+    if not hasattr(socket, "AF_UNIX"):
+        return False
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+
+def start_check_daemon(project_dir: str, socket_path: str, wait: bool = True) -> bool:
+    """
+    Fork a detached check daemon for the project, at most once per hook.
+    Returns True once its socket is accepting connections, or as soon as it
+    is forked if `wait` is False.
+    """
+    if socket_path in forked_daemons:
+        return wait_for_check_daemon(socket_path) if wait else True
+
+    if fcntl is None or not hasattr(os, "fork"):
+        return False
+
+    # The daemon writes to this pipe once it is listening, or exits without
+    # writing if another daemon already holds the project's lock
+    ready_r, ready_w = os.pipe()
+    try:
+        pid = os.fork()
+    except OSError:
+        os.close(ready_r)
+        os.close(ready_w)
+        return False
+
+    if pid == 0:
+        # Detach from the hook so Claude Code does not wait on our output
+        try:
+            os.setsid()
+            # Inherited descriptors such as the batch lock would otherwise stay
+            # held (and their locks with them) for the daemon's whole lifetime
+            os.closerange(3, ready_w)
+            os.closerange(ready_w + 1, os.sysconf("SC_OPEN_MAX"))
+            devnull = os.open(os.devnull, os.O_RDWR)
+            for fd in (0, 1, 2):
+                os.dup2(devnull, fd)
+            os.close(devnull)
+            # Let stop_check_daemon() unwind serve_checks so the socket is removed
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+            serve_checks(project_dir, socket_path, ready_w)
+        finally:
+            os._exit(0)
+
+    os.close(ready_w)
+    forked_daemons[socket_path] = pid
+    daemon_ready_fds[socket_path] = ready_r
+    return wait_for_check_daemon(socket_path) if wait else True
+
+
+def stop_check_daemon(socket_path: str) -> None:
+    """Stop a daemon forked by this hook, along with any check it is running."""
+    pid = forked_daemons.pop(socket_path, None)
+    ready_fd = daemon_ready_fds.pop(socket_path, None)
+    if ready_fd is not None:
+        os.close(ready_fd)
+    if pid is None:
+        return
+    # The daemon leads its own session, so its process group covers moon and cargo
+    try:
+        os.killpg(pid, signal.SIGTERM)
+    except OSError:
+        pass
+
+
+def wait_for_check_daemon(socket_path: str) -> bool:
+    """
+    Give a daemon forked by this hook a moment to bind before falling back to
+    a direct check. Returns as soon as it loses the start to another daemon.
+    """
+    ready_fd = daemon_ready_fds.pop(socket_path, None)
+    if ready_fd is None:
+        return daemon_listening(socket_path)
+
+    try:
+        ready, _, _ = select.select([ready_fd], [], [], DAEMON_START_TIMEOUT)
+        if ready and os.read(ready_fd, 1):
+            return True
+    finally:
+        os.close(ready_fd)
+
+    # The daemon that won the start may already be listening
+    return daemon_listening(socket_path)
+
+
+def query_check_daemon(
+    socket_path: str, file_path: str
+) -> tuple[bool, str, list[dict] | None, bool] | None:
+    """
+    Ask a running check daemon for the current check result.
+    Returns None if no daemon is listening.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except OSError:
+        client.close()
+        return None
+
+    with client:
+        client.settimeout(CHECK_TIMEOUT)
+        try:
+            client.sendall(json_dumps({"file": file_path}).encode() + b"\n")
+            response = json_loads(client.makefile("rb").read())
+        except socket.timeout:
+            return True, f"Rust check timed out after {CHECK_TIMEOUT} seconds", None, False
+        except (OSError, ValueError):
+            return None
+
+    return (
+        response["has_issues"],
+        response["output"],
+        response.get("diagnostics"),
+        response.get("completed", True),
+    )
+
+
+def request_rust_check(
+    project_dir: str, file_path: str
+) -> tuple[bool, str, list[dict] | None, bool]:
+    """
+    Get the check result from the project's check daemon, starting it if needed.
+    Falls back to running the check directly if the daemon is unavailable.
+    Returns (has_issues, output, diagnostics, completed) as run_rust_check does.
+    """
+    socket_path = check_socket_path(project_dir)
+
+    result = query_check_daemon(socket_path, file_path)
+    if result is None and start_check_daemon(project_dir, socket_path):
+        result = query_check_daemon(socket_path, file_path)
+
+    if result is None:
+        return run_rust_check(project_dir)
+    return result
 
 
 def extract_relevant_warnings(output: str, edited_file: str) -> list[str]:
-    """Extract warnings/errors relevant to the edited file."""
+    """Extract warning/error blocks relevant to the edited file."""
     if not output:
         return []
     
-    lines = output.split('\n')
-    relevant_warnings = []
-    current_warning = []
-    capturing = False
-    
-    # Get the relative path for matching
+    # Get the file name for matching against `-->` references
     edited_file_name = Path(edited_file).name
     
+    return [
+        block.rstrip()
+        for block in WARNING_BLOCK_RE.findall(output)
+        if edited_file_name in block or edited_file in block
+    ]
+
+
+def build_feedback(
+    has_issues: bool, output: str, diagnostics: list[dict] | None, file_path: str
+) -> dict | None:
+    """Build the hook feedback for a check result, or None if there is nothing to report."""
+    if not has_issues:
+        return None
+
+    # Extract warnings relevant to the edited file
+    if diagnostics is not None:
+        edited_file = os.path.abspath(file_path)
+        relevant_warnings = [
+            d["rendered"].rstrip() for d in diagnostics if edited_file in d["files"]
+        ]
+    else:
+        relevant_warnings = extract_relevant_warnings(output, file_path)
+
+    if relevant_warnings:
+        warning_text = '\n\n'.join(relevant_warnings)
+
+        # Use JSON output to provide feedback to Claude
+        return {
+            "decision": "block",
+            "reason": f"Rust compiler issues detected in {Path(file_path).name}:\n\n{warning_text}\n\nPlease fix these issues immediately.",
+            "hookSpecificOutput": {
+                "hookEventName": "PostToolUse",
+                "additionalContext": f"The file {file_path} has compilation issues that need to be addressed."
+            }
+        }
+
+    if diagnostics:
+        # Rendered JSON diagnostics read "error[E0425]: ...", so go by their level
+        workspace_issues = any(
+            d.get("level", "").startswith(("error", "warning")) for d in diagnostics
+        )
+    else:
+        workspace_issues = "warning:" in output.lower() or "error:" in output.lower()
+
+    if workspace_issues:
+        # General warnings/errors in the workspace
+        return workspace_feedback([file_path])
+
+    return None
+
+
+def workspace_feedback(file_paths: list[str]) -> dict:
+    """Build the hook feedback for workspace issues not located in the edited files."""
+    file_names = ", ".join(Path(file_path).name for file_path in file_paths)
+    return {
+        "decision": "block",
+        "reason": f"Rust compiler issues detected in workspace after editing {file_names}. Please run 'just check' to see all issues and fix them.",
+        "hookSpecificOutput": {
+            "hookEventName": "PostToolUse",
+            "additionalContext": WORKSPACE_CONTEXT
+        }
+    }
+
+
+def enqueue_edit(project_dir: str, entry: dict) -> None:
+    """Append an edited file to the project's pending check queue."""
+    with open(runtime_path(project_dir, "queue"), "a", encoding="utf-8") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.write(json_dumps(entry) + "\n")
+
+
+def drain_edit_queue(project_dir: str) -> list[dict]:
+    """Take every pending edit off the queue, keeping the latest entry per file."""
+    try:
+        f = open(runtime_path(project_dir, "queue"), "r+", encoding="utf-8")
+    except FileNotFoundError:
+        return []
+
+    with f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        lines = f.read().splitlines()
+        f.seek(0)
+        f.truncate()
+
+    entries = {}
     for line in lines:
-        # Start of a new warning/error
-        if 'warning:' in line or 'error:' in line:
-            # Save previous warning if it was relevant
-            if capturing and current_warning:
-                relevant_warnings.extend(current_warning)
-            
-            current_warning = [line]
-            # Check if this warning is for our file
-            capturing = edited_file_name in line or edited_file in line
-        elif line.startswith('  -->') and capturing:
-            # File reference line - double-check if it's our file
-            capturing = edited_file_name in line or edited_file in line
-            if capturing:
-                current_warning.append(line)
-        elif capturing and (line.startswith('   ') or line.startswith('  |') or line.strip() == ''):
-            # Continuation of current warning
-            current_warning.append(line)
-        elif line.strip() == '' and capturing:
-            # End of current warning
-            if current_warning:
-                relevant_warnings.extend(current_warning)
-                relevant_warnings.append('')  # Add blank line for readability
-            current_warning = []
-            capturing = False
-    
-    # Don't forget the last warning
-    if capturing and current_warning:
-        relevant_warnings.extend(current_warning)
-    
-    return relevant_warnings
+        try:
+            entry = json_loads(line)
+        except ValueError:
+            continue
+        entries.pop(entry["file"], None)
+        entries[entry["file"]] = entry
+    return list(entries.values())
+
+
+def has_queued_edits(project_dir: str) -> bool:
+    """Check whether any edits are waiting to be checked."""
+    try:
+        return os.path.getsize(runtime_path(project_dir, "queue")) > 0
+    except OSError:
+        return False
+
+
+def record_result(state: dict, entry: dict, feedback: dict | None) -> None:
+    """Remember the check result for an edit so identical re-saves can be skipped."""
+    if entry.get("hash"):
+        state.pop(entry["file"], None)  # Move it to the most recent end
+        state[entry["file"]] = {
+            "hash": entry["hash"],
+            "result": "dirty" if feedback else "clean",
+            "workspace_fp": entry["workspace_fp"],
+            "feedback": feedback,
+        }
+
+
+def unchecked_feedback(file_paths: list[str]) -> dict:
+    """Build the hook feedback for queued edits there was no time left to check."""
+    file_names = ", ".join(Path(file_path).name for file_path in file_paths)
+    return {
+        "decision": "block",
+        "reason": f"Rust check skipped for {file_names}: the edits arrived too late to check before the hook timed out. Please run 'just check' to see any issues in them.",
+        "hookSpecificOutput": {
+            "hookEventName": "PostToolUse",
+            "additionalContext": "Some recent edits have not been checked for compilation issues."
+        }
+    }
+
+
+def merge_feedback(feedbacks: list[tuple[str, dict]]) -> dict | None:
+    """
+    Combine the (file_path, feedback) pairs for several edited files into one
+    hook response, reporting workspace-wide issues only once.
+    """
+    if len(feedbacks) <= 1:
+        return feedbacks[0][1] if feedbacks else None
+
+    workspace_files = [
+        file_path for file_path, feedback in feedbacks
+        if feedback["hookSpecificOutput"]["additionalContext"] == WORKSPACE_CONTEXT
+    ]
+    merged = [
+        feedback for _, feedback in feedbacks
+        if feedback["hookSpecificOutput"]["additionalContext"] != WORKSPACE_CONTEXT
+    ]
+    if workspace_files:
+        merged.append(workspace_feedback(workspace_files))
+
+    return {
+        "decision": "block",
+        "reason": "\n\n".join(feedback["reason"] for feedback in merged),
+        "hookSpecificOutput": {
+            "hookEventName": "PostToolUse",
+            "additionalContext": " ".join(
+                feedback["hookSpecificOutput"]["additionalContext"] for feedback in merged
+            )
+        }
+    }
+
+
+def check_fits_in_hook() -> bool:
+    """Check whether another debounced check can finish before the hook times out."""
+    elapsed = time.monotonic() - HOOK_STARTED
+    return elapsed + DEBOUNCE_DELAY + CHECK_TIMEOUT <= HOOK_TIMEOUT
+
+
+def check_batched(project_dir: str, entry: dict) -> dict | None:
+    """
+    Check the workspace once for a burst of edits.
+    The first hook of a burst holds the batch lock, waits for the burst to
+    settle, then runs a single check covering every queued file. Other hooks
+    only queue their file and exit.
+    The holder keeps checking newly queued edits only while another check
+    still fits within the hook timeout, and names any it had to leave unchecked.
+    Returns the feedback for the edits checked by this hook, or None.
+    """
+    if fcntl is None:
+        has_issues, output, diagnostics, completed = request_rust_check(
+            project_dir, entry["file"]
+        )
+        feedback = build_feedback(has_issues, output, diagnostics, entry["file"])
+        if completed:
+            state = load_check_state(project_dir)
+            record_result(state, entry, feedback)
+            save_check_state(project_dir, state)
+        return feedback
+
+    # Queue before locking, so a holder that is about to release still sees this edit
+    enqueue_edit(project_dir, entry)
+
+    feedbacks = []
+    unchecked = []
+    first_check = True
+    while True:
+        lock_file = open(runtime_path(project_dir, "batch.lock"), "w")
+        with lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                break  # Another hook is batching and will check our edit
+
+            while has_queued_edits(project_dir):
+                if not (first_check or check_fits_in_hook()):
+                    # Their hooks have already exited, so report the files now
+                    # rather than leave them for whichever edit comes next
+                    unchecked.extend(queued["file"] for queued in drain_edit_queue(project_dir))
+                    break
+
+                first_check = False
+                time.sleep(DEBOUNCE_DELAY)  # Let the rest of the burst arrive
+                entries = drain_edit_queue(project_dir)
+                if not entries:
+                    break
+
+                has_issues, output, diagnostics, completed = request_rust_check(
+                    project_dir, entries[-1]["file"]
+                )
+                state = load_check_state(project_dir)
+                for queued in entries:
+                    feedback = build_feedback(has_issues, output, diagnostics, queued["file"])
+                    # A check that did not finish says nothing about this content
+                    if completed:
+                        record_result(state, queued, feedback)
+                    if feedback:
+                        feedbacks.append((queued["file"], feedback))
+                if completed:
+                    save_check_state(project_dir, state)
+
+        # Edits queued between our last drain and releasing the lock are still ours
+        if not has_queued_edits(project_dir):
+            break
+
+    if unchecked:
+        unchecked = list(dict.fromkeys(unchecked))
+        feedbacks.append((unchecked[-1], unchecked_feedback(unchecked)))
+    return merge_feedback(feedbacks)
 
 
 def main():
     try:
-        # Read input from stdin
-        input_data = json.load(sys.stdin)
-    except json.JSONDecodeError as e:
+        # Read input from stdin as bytes, skipping the text decode layer
+        input_data = json_loads(sys.stdin.buffer.read())
+    except ValueError as e:
         print(f"Error: Invalid JSON input: {e}", file=sys.stderr)
         sys.exit(1)
     
@@ -125,49 +807,69 @@ def main():
     if tool_name not in ["Edit", "MultiEdit", "Write"]:
         sys.exit(0)  # Only check file modification tools
     
-    # Get the file path
-    file_path = tool_input.get("file_path", "")
-    if not file_path or not is_rust_file(file_path):
-        sys.exit(0)  # Only check Rust files
-    
     # Get project directory
     project_dir = os.environ.get("CLAUDE_PROJECT_DIR")
     if not project_dir:
         project_dir = input_data.get("cwd", ".")
+    project_dir = os.path.abspath(project_dir)
     
-    # Run the Rust check
-    has_issues, output = run_rust_check(project_dir)
+    # Get the file path
+    file_path = tool_input.get("file_path", "")
+    if not file_path or not is_rust_file(file_path, project_dir):
+        sys.exit(0)  # Only check Rust files
     
-    if has_issues:
-        # Extract warnings relevant to the edited file
-        relevant_warnings = extract_relevant_warnings(output, file_path)
-        
-        if relevant_warnings:
-            warning_text = '\n'.join(relevant_warnings)
-            
-            # Use JSON output to provide feedback to Claude
-            feedback = {
-                "decision": "block",
-                "reason": f"Rust compiler issues detected in {Path(file_path).name}:\n\n{warning_text}\n\nPlease fix these issues immediately.",
-                "hookSpecificOutput": {
-                    "hookEventName": "PostToolUse",
-                    "additionalContext": f"The file {file_path} has compilation issues that need to be addressed."
-                }
-            }
-            
-            print(json.dumps(feedback))
-        elif "warning:" in output.lower() or "error:" in output.lower():
-            # General warnings/errors in the workspace
-            feedback = {
-                "decision": "block", 
-                "reason": f"Rust compiler issues detected in workspace after editing {Path(file_path).name}. Please run 'just check' to see all issues and fix them.",
-                "hookSpecificOutput": {
-                    "hookEventName": "PostToolUse",
-                    "additionalContext": "There are compilation issues in the workspace that may be related to recent changes."
-                }
-            }
-            
-            print(json.dumps(feedback))
+    # Checks (including the daemon forked from here) run from the project directory
+    try:
+        os.chdir(project_dir)
+    except OSError:
+        sys.exit(0)  # Nothing to check outside an existing project
+    
+    # Get a check under way before knowing whether it is needed: a newly
+    # forked daemon starts checking while the edited file is hashed below,
+    # and is stopped again if the memo shows no check is needed
+    socket_path = check_socket_path(project_dir)
+    daemon_forked = (
+        not daemon_listening(socket_path)
+        and start_check_daemon(project_dir, socket_path, wait=False)
+    )
+
+    memo_key = {}
+
+    def compute_memo_key():
+        memo_key["hash"] = hash_file(file_path)
+        memo_key["workspace_fp"] = list(source_fingerprint(project_dir, exclude=file_path))
+
+    hasher = threading.Thread(target=compute_memo_key)
+    hasher.start()
+    state = load_check_state(project_dir)
+    hasher.join()
+
+    # Re-saving identical content into an unchanged workspace cannot change the result
+    content_hash = memo_key["hash"]
+    workspace_fp = memo_key["workspace_fp"]
+    previous = state.get(file_path)
+    if (
+        content_hash
+        and previous
+        and previous.get("hash") == content_hash
+        and previous.get("workspace_fp") == workspace_fp
+    ):
+        # Its lint would hold cargo's build lock for nothing
+        if daemon_forked:
+            stop_check_daemon(socket_path)
+        if previous.get("feedback"):
+            print(json_dumps(previous["feedback"]))
+        sys.exit(0)
+
+    # Run the Rust check, batched with any other edits arriving in the same burst
+    feedback = check_batched(project_dir, {
+        "file": file_path,
+        "hash": content_hash,
+        "workspace_fp": workspace_fp,
+    })
+
+    if feedback:
+        print(json_dumps(feedback))
     
     # Exit with 0 for success (no blocking)
     sys.exit(0)
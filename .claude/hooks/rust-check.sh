@@ -0,0 +1,36 @@
+#!/bin/sh
+# PostToolUse entry point for rust-check.py.
+# Edits to non-Rust files are filtered out here so Python only starts when needed.
+
+hook_dir=$(dirname "$0")
+
+input=$(mktemp) || exec python3 "$hook_dir/rust-check.py"
+cat > "$input"
+
+# Print the string value of a top-level JSON key from the buffered input
+json_value() {
+    value=$(grep -Eo "\"$1\"[[:space:]]*:[[:space:]]*\"$2\"" "$input" | head -n 1)
+    value=${value%\"}
+    printf '%s' "${value##*\"}"
+}
+
+skip() {
+    rm -f "$input"
+    exit 0
+}
+
+# Same rules as is_rust_file(): .rs sources outside generated and vendored
+# trees, judged by the directories below the project directory only
+file_path=$(json_value file_path '[^"]*\.rs')
+[ -n "$file_path" ] || skip
+
+project_dir=${CLAUDE_PROJECT_DIR:-$(json_value cwd '[^"]*')}
+relative=${file_path#"${project_dir%/}/"}
+case "/$relative" in
+    */target/* | */.git/* | */node_modules/* | */.moon/*) skip ;;
+esac
+
+# Hand the buffered input to Python through an open descriptor so the file can go now
+exec 3< "$input"
+rm -f "$input"
+exec python3 "$hook_dir/rust-check.py" <&3 3<&-
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Smoke tests for the rust-check daemon lifecycle: start, query, stale socket
+recovery and concurrent starts. The Rust check itself is replaced by a stub,
+so neither cargo nor moon is needed.
+
+Run directly (`python3 .claude/hooks/test_check_daemon.py`) or with pytest.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import importlib.util
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+HOOKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HOOKS_DIR)
+
+spec = importlib.util.spec_from_file_location(
+    "rust_check", os.path.join(HOOKS_DIR, "rust-check.py")
+)
+rust_check = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(rust_check)
+
+# Forked daemons inherit these, so they never run cargo and exit soon after the tests
+rust_check.run_rust_check = lambda project_dir: (True, f"checked {project_dir}", None, True)
+rust_check.DAEMON_IDLE_TIMEOUT = 10
+
+
+def make_project() -> tuple[str, str]:
+    """Create an empty project with its own runtime directory; returns (project, socket)."""
+    root = tempfile.mkdtemp(prefix="tram-check-test-")
+    project_dir = os.path.join(root, "project")
+    os.mkdir(project_dir)
+    rust_check.RUNTIME_DIR = root
+    return project_dir, rust_check.check_socket_path(project_dir)
+
+
+def stop_daemon(socket_path: str) -> None:
+    """Stop the daemon recorded in the socket's lock file, if any, and clean up."""
+    try:
+        with open(f"{socket_path}.lock") as f:
+            os.kill(int(f.read()), signal.SIGTERM)
+    except (OSError, ValueError):
+        pass
+    rust_check.forked_daemons.pop(socket_path, None)
+    shutil.rmtree(os.path.dirname(socket_path), ignore_errors=True)
+
+
+def test_start_and_query():
+    project_dir, socket_path = make_project()
+    try:
+        assert not rust_check.daemon_listening(socket_path)
+        assert rust_check.start_check_daemon(project_dir, socket_path)
+        assert rust_check.daemon_listening(socket_path)
+        assert rust_check.query_check_daemon(socket_path, "src/lib.rs") == (
+            True, f"checked {project_dir}", None, True
+        )
+    finally:
+        stop_daemon(socket_path)
+
+
+def test_stale_socket_recovery():
+    project_dir, socket_path = make_project()
+    # A socket file left behind by a daemon that was killed
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+    try:
+        assert not rust_check.daemon_listening(socket_path)
+        assert rust_check.query_check_daemon(socket_path, "src/lib.rs") is None
+        assert rust_check.start_check_daemon(project_dir, socket_path)
+        assert rust_check.query_check_daemon(socket_path, "src/lib.rs") is not None
+    finally:
+        stop_daemon(socket_path)
+
+
+def test_concurrent_start():
+    project_dir, socket_path = make_project()
+    try:
+        assert rust_check.start_check_daemon(project_dir, socket_path)
+        with open(f"{socket_path}.lock") as f:
+            daemon_pid = f.read()
+
+        # A second hook's daemon loses the lock and must leave the socket alone
+        rust_check.forked_daemons.pop(socket_path)
+        started = time.monotonic()
+        assert rust_check.start_check_daemon(project_dir, socket_path)
+        assert time.monotonic() - started < rust_check.DAEMON_START_TIMEOUT
+
+        with open(f"{socket_path}.lock") as f:
+            assert f.read() == daemon_pid
+        assert rust_check.query_check_daemon(socket_path, "src/lib.rs") is not None
+    finally:
+        stop_daemon(socket_path)
+
+
+def test_incomplete_check_is_retried():
+    project_dir, socket_path = make_project()
+    # Counts checks in the daemon; the first one times out
+    attempts = os.path.join(project_dir, "attempts")
+
+    def flaky_check(project_dir):
+        with open(attempts, "a") as f:
+            f.write(".")
+        with open(attempts) as f:
+            completed = len(f.read()) > 1
+        return completed, "checked" if completed else "timed out", None, completed
+
+    run_rust_check = rust_check.run_rust_check
+    rust_check.run_rust_check = flaky_check
+    try:
+        assert rust_check.start_check_daemon(project_dir, socket_path)
+        assert rust_check.query_check_daemon(socket_path, "src/lib.rs") == (
+            True, "checked", None, True
+        )
+    finally:
+        rust_check.run_rust_check = run_rust_check
+        stop_daemon(socket_path)
+
+
+def test_stop_forked_daemon():
+    project_dir, socket_path = make_project()
+    try:
+        assert rust_check.start_check_daemon(project_dir, socket_path)
+        with open(f"{socket_path}.lock") as f:
+            daemon_pid = int(f.read())
+
+        rust_check.stop_check_daemon(socket_path)
+        deadline = time.monotonic() + 2
+        while os.path.exists(socket_path) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert not os.path.exists(socket_path)
+        assert socket_path not in rust_check.forked_daemons
+
+        # Reap the daemon; nothing is left running once it has exited
+        os.waitpid(daemon_pid, 0)
+    finally:
+        stop_daemon(socket_path)
+
+
+def test_daemon_does_not_hold_inherited_locks():
+    project_dir, socket_path = make_project()
+    batch_lock = os.path.join(os.path.dirname(socket_path), "batch.lock")
+    try:
+        with open(batch_lock, "w") as held:
+            fcntl.flock(held, fcntl.LOCK_EX)
+            assert rust_check.start_check_daemon(project_dir, socket_path)
+
+        with open(batch_lock, "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    finally:
+        stop_daemon(socket_path)
+
+
+if __name__ == "__main__":
+    tests = [(name, test) for name, test in globals().items() if name.startswith("test_")]
+    for name, test in tests:
+        test()
+        print(f"ok  {name}")